@@ -4,36 +4,85 @@ from datetime import datetime
 from enum import Enum
 import gevent
 from gevent import monkey
+# must patch before requests/urllib3 and friends are imported so they use cooperative sockets
 monkey.patch_all()
+import gevent.event
 from gevent.pool import Pool
 from http import cookiejar
 import json
 import os
 from progress.bar import IncrementalBar
+import random
 import re
 import requests
 from requests_toolbelt import sessions
-from subprocess import Popen, PIPE
+from subprocess import Popen, DEVNULL, PIPE
 import sys
+from tempfile import TemporaryFile
 from time import sleep
 import urllib.parse
+from urllib3.util.retry import Retry
+
+# orjson is optional, but much faster on large channel listings and chat logs
+try:
+    import orjson
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj):
+        return json.dumps(obj).encode()
+    json_loads = json.loads
+
+# PyAV is optional, only used with --remux-in-process
+try:
+    import av
+except ImportError:
+    av = None
+
+# requests-cache is optional, used to keep public API responses between runs
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
 
 VERSION_STRING = "2024.08.30"
 ISSUES_URL = "https://github.com/HoloArchivists/OPENREC-dl/issues"
 
-OPENREC = r'^(?:https?:\/\/)?(?:www\.)?openrec\.tv\/(?P<type>[^\/]+?)\/(?P<id>[^\/]+)$'
-VALID_LIVE_ID = r'^(?P<id>[a-zA-Z0-9]+?)$'
-FULL_SIZE_IMG = r'\.w[0-9]{1,}\.ttl[0-9]{1,}\.(?P<ext>[a-z]{1,4})\?'
+OPENREC = re.compile(r'^(?:https?:\/\/)?(?:www\.)?openrec\.tv\/(?P<type>[^\/]+?)\/(?P<id>[^\/]+)$')
+VALID_LIVE_ID = re.compile(r'^(?P<id>[a-zA-Z0-9]+?)$')
+FULL_SIZE_IMG = re.compile(r'\.w[0-9]{1,}\.ttl[0-9]{1,}\.(?P<ext>[a-z]{1,4})\?')
 FULL_SIZE_REP = r'.\g<ext>?q=100&quality=100&'
-CLEAN_FILENAME_KINDA = r'[^\w\-_\. \[\]\(\)]'
-OLD_PL_HOST = r'^https?:\/\/openrec-live\.s3\.amazonaws\.com\/studio\/[0-9]{1,}\/(?P<vid>[0-9]{1,})\/index\.m3u8$'
-NEW_PL_HOST = r'^https?:\/\/[a-z0-9]{1,}\.cloudfront\.net\/[a-f0-9]{1,}\/(?P<pname>[^\/]+)\.m3u8$'
-GAME_PL_HOST = r'^https?:\/\/[a-z0-9]{1,}\.cloudfront\.net\/[0-9]{1,}\/[0-9]{1,}_[a-zA-Z]{1,}\/game\/(?P<pname>[^\/]+)\.m3u8$'
+CLEAN_FILENAME_KINDA = re.compile(r'[^\w\-_\. \[\]\(\)]')
+OLD_PL_HOST = re.compile(r'^https?:\/\/openrec-live\.s3\.amazonaws\.com\/studio\/[0-9]{1,}\/(?P<vid>[0-9]{1,})\/index\.m3u8$')
+NEW_PL_HOST = re.compile(r'^https?:\/\/[a-z0-9]{1,}\.cloudfront\.net\/[a-f0-9]{1,}\/(?P<pname>[^\/]+)\.m3u8$')
+GAME_PL_HOST = re.compile(r'^https?:\/\/[a-z0-9]{1,}\.cloudfront\.net\/[0-9]{1,}\/[0-9]{1,}_[a-zA-Z]{1,}\/game\/(?P<pname>[^\/]+)\.m3u8$')
+M3U8_LINE = re.compile(
+    r'^(?:#EXT-X-MEDIA:(?P<media>[^\r\n]*)|#EXT-X-STREAM-INF:(?P<format>[^\r\n]*)|(?P<uri>[^#\r\n][^\r\n]*))\r?$', re.MULTILINE)
+M3U8_SEGMENT = re.compile(r'^[^#\r\n][^\r\n]*', re.MULTILINE)
+M3U8_ATTRIBUTE = re.compile(r'(?P<key>[A-Z0-9-]+)=(?P<val>"[^"]+"|[^",]+)(?:,|$)')
 COOKIE_DOMAIN = "www.openrec.tv"
 PUBLIC_API = "https://public.openrec.tv/external/api/v5/"
 PRIVATE_API = "https://apiv5.openrec.tv/api/v5/"
 LOGIN_ENDPOINT = "https://www.openrec.tv/viewapp/v4/mobile/user/login"
 MAX_MOVIE_RESPONSE = 40
+MOVIE_PAGE_BATCH = 8
+MAX_BUFFERED_SEGMENTS = 32
+MAX_DOWNLOAD_ROUNDS = 10
+API_CACHE_NAME = ".openrec-dl-cache"
+API_CACHE_EXPIRY = 600
+# (connect, read) timeouts in seconds
+API_TIMEOUT = (5, 15)
+IMG_TIMEOUT = (5, 30)
+SEG_TIMEOUT = (5, 20)
+SEGMENT_BACKOFF_BASE = 0.2
+SEGMENT_BACKOFF_CAP = 10
+CIRCUIT_BREAKER_FAILURES = 20
+CIRCUIT_BREAKER_COOLDOWN = 30
+WRITE_BUFFER_SIZE = 1 << 20
+SEGMENT_CHUNK_SIZE = 1 << 16
+RANGE_MAX_SEGMENTS = 50
+RANGE_THRESHOLD = 10 << 20
+RANGE_SPLIT = 4
 
 NORMAL_MAP = {
     "url": "normal",
@@ -75,72 +124,215 @@ class DownloadBar(IncrementalBar):
 
     @property
     def time_remaining(self):
-        time_per_event = float(self.elapsed) / float(self.index)
-        seconds_remaining = time_per_event * self.remaining
-        m = seconds_remaining % 60
-        s = seconds_remaining / 60
-        return f"{int(m)}:{int(s):02}"
+        # progress already keeps a moving average of seconds per segment in avg
+        seconds_remaining = self.avg * self.remaining
+        return f"{int(seconds_remaining // 60)}:{int(seconds_remaining % 60):02}"
 
 
 class StreamDownloader():
     def __init__(self, playlist_base):
-        self.m3u8_session = sessions.BaseUrlSession(base_url=playlist_base)
-        adapter = requests.adapters.HTTPAdapter(
-            pool_connections=5, pool_maxsize=5, max_retries=10)
-        self.m3u8_session.mount('http://', adapter)
-        self.m3u8_session.mount('https://', adapter)
+        # keep a connection alive for every worker (and its range requests) so none of them redo the handshake
+        # only retry failed connects here, _download_worker handles everything else with its own backoff
+        self.m3u8_session = make_session(
+            playlist_base, pool_maxsize=args.concurrent * RANGE_SPLIT, retries=Retry(connect=2, read=False, status=0))
         self.m3u8_session.headers = {"Referer": "https://www.openrec.tv/"}
+        self.pool = Pool(args.concurrent)
         self.success = True
+        self.gave_up = False
         self.failed_list = []
         self.completed = {}
-
-    def run(self, stream_filename, ts_list, download_bar):
-        self.stream_filename = stream_filename
-        self.stream_file = open(os.path.join(
-            args.directory, f"{stream_filename}.ts.tmp"), "ab")
+        self.next_index = 0
+        self.window_moved = gevent.event.Event()
+        self.segment_ready = gevent.event.Event()
+        self.consecutive_failures = 0
+        self.breaker_closed = gevent.event.Event()
+        self.breaker_closed.set()
+
+    def run(self, stream_file, ts_list, download_bar):
+        self.stream_file = stream_file
+        # the stream may be a pipe to ffmpeg rather than a file on disk
+        if self.stream_file.seekable():
+            self._preallocate(ts_list)
         self.ts_count = len(ts_list)
         self.download_bar = download_bar
         join_thread = gevent.spawn(self._append_file)
-        self._download_segments(ts_list)
+        self._download_segments(enumerate(ts_list))
         join_thread.join()
 
+    def _preallocate(self, ts_list):
+        # reserve the estimated size up front so the file isn't fragmented as it grows
+        if not hasattr(os, "posix_fallocate") or not ts_list:
+            return
+        try:
+            head_r = self.m3u8_session.head(ts_list[0], timeout=SEG_TIMEOUT)
+            segment_size = int(head_r.headers.get("Content-Length", 0))
+            if head_r.ok and segment_size > 0:
+                os.posix_fallocate(self.stream_file.fileno(),
+                                   0, segment_size * len(ts_list))
+        except (requests.RequestException, ValueError, OSError):
+            print_log("download worker", "could not preallocate video file", LogLevel.VERBOSE)
+
     def _download_segments(self, ts_list):
-        Pool(10).map(self._download_worker, ts_list)
-        if not self.success:
-            ts_list = self.failed_list
+        stalled_rounds = 0
+        while stalled_rounds < MAX_DOWNLOAD_ROUNDS:
+            round_start_index = self.next_index
+            self.success = True
+            # workers start as segments are handed out, their results aren't needed
+            for _ in self.pool.imap_unordered(self._download_worker, ts_list):
+                pass
+            if self.success or self.gave_up:
+                return
+            # segments deferred behind a failed one don't use up retries, only rounds where the writer got nowhere
+            if self.next_index == round_start_index:
+                stalled_rounds += 1
+            else:
+                stalled_rounds = 0
+            # retry in playlist order so the segment blocking the window goes first
+            ts_list = sorted(self.failed_list, key=lambda ts_tuple: ts_tuple[0])
             self.failed_list = []
-            self._download_segments(ts_list)
+            print_log("download worker",
+                      f"retrying {len(ts_list)} segments ({stalled_rounds}/{MAX_DOWNLOAD_ROUNDS})...", LogLevel.VERBOSE)
+        self._give_up()
+
+    def _give_up(self):
+        # stop the writer from waiting on segments that won't arrive, and workers from fetching them
+        self.success = False
+        self.gave_up = True
+        self.segment_ready.set()
+        self._move_window()
 
     def _download_worker(self, ts_tuple):
-        ts_segment = ts_tuple[0]
-        ts_index = ts_tuple[1]
+        ts_index, ts_segment = ts_tuple
+        if self.gave_up:
+            return
+        # only keep a bounded number of segments in memory ahead of the writer
+        while ts_index >= self.next_index + MAX_BUFFERED_SEGMENTS:
+            if not self.success:
+                # a segment before this one failed and won't be retried until this round ends
+                self.failed_list.append(ts_tuple)
+                return
+            self.window_moved.wait()
         for retry in range(0, 5):
+            # hold off while the circuit breaker is open
+            self.breaker_closed.wait()
+            if self.gave_up:
+                return
             try:
-                ts_r = self.m3u8_session.get(ts_segment)
-                if ts_r.ok:
-                    segment_filename = f"{self.stream_filename}.seg{ts_index}"
-                    with open(os.path.join(args.directory, segment_filename), 'wb') as segment_file:
-                        segment_file.write(ts_r.content)
-                    self.completed[ts_index] = segment_filename
-                    return
+                segment = self._get_segment(ts_segment)
             except:
+                segment = None
                 print_log(
                     "download worker", f"failed to download {ts_segment}, retrying ({retry}/5)...")
+            if segment is None:
+                segment = self._count_failure(ts_segment)
+                if self.gave_up:
+                    return
+            if segment is not None:
+                self.consecutive_failures = 0
+                self.completed[ts_index] = segment
+                # only wake the writer if it's waiting on this segment
+                if ts_index == self.next_index:
+                    self.segment_ready.set()
+                return
+            # back off with jitter so workers' retries don't hit the CDN in lockstep
+            if retry < 4:
+                sleep(min(SEGMENT_BACKOFF_CAP, SEGMENT_BACKOFF_BASE * 2 ** retry) * (0.5 + random.random()))
         self.success = False
+        self.failed_list.append(ts_tuple)
+        self._move_window()
+
+    def _count_failure(self, ts_segment):
+        self.consecutive_failures += 1
+        if self.consecutive_failures < CIRCUIT_BREAKER_FAILURES or not self.breaker_closed.is_set():
+            return None
+        # the CDN is failing everything, so pause all workers and then try a single segment
+        print_log("download worker",
+                  f"{self.consecutive_failures} segment requests failed in a row, pausing for {CIRCUIT_BREAKER_COOLDOWN} seconds...")
+        self.breaker_closed.clear()
+        sleep(CIRCUIT_BREAKER_COOLDOWN)
+        try:
+            segment = self._get_segment(ts_segment)
+        except:
+            segment = None
+        if segment is None:
+            print_log("download worker", "segments are still failing, giving up on the download")
+            self._give_up()
+        self.breaker_closed.set()
+        return segment
+
+    def _get_segment(self, ts_segment):
+        # playlists with few segments have long ones, which are split into ranges over several connections
+        if self.ts_count < RANGE_MAX_SEGMENTS:
+            head_r = self.m3u8_session.head(ts_segment, timeout=SEG_TIMEOUT)
+            segment_size = int(head_r.headers.get("Content-Length", 0))
+            if head_r.ok and segment_size > RANGE_THRESHOLD:
+                return self._get_segment_ranges(ts_segment, segment_size)
+        with self.m3u8_session.get(ts_segment, stream=True, timeout=SEG_TIMEOUT) as ts_r:
+            if not ts_r.ok:
+                return None
+            return self._read_segment(ts_r)
+
+    def _read_segment(self, ts_r):
+        segment_size = int(ts_r.headers.get("Content-Length", 0))
+        if segment_size <= 0 or "Content-Encoding" in ts_r.headers:
+            # decoded size isn't known ahead of time
+            segment = bytearray()
+            for chunk in ts_r.iter_content(SEGMENT_CHUNK_SIZE):
+                segment.extend(chunk)
+            return segment
+        # read straight into a buffer of the final size, avoiding the copy made by ts_r.content
+        segment = bytearray(segment_size)
+        with memoryview(segment) as segment_view:
+            offset = 0
+            for chunk in ts_r.iter_content(SEGMENT_CHUNK_SIZE):
+                segment_view[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+        return segment if offset == segment_size else None
+
+    def _get_segment_ranges(self, ts_segment, segment_size):
+        range_size = -(-segment_size // RANGE_SPLIT)
+        range_jobs = [gevent.spawn(self.m3u8_session.get, ts_segment,
+                                   headers={"Range": f"bytes={start}-{min(start + range_size, segment_size) - 1}"}, timeout=SEG_TIMEOUT)
+                      for start in range(0, segment_size, range_size)]
+        gevent.joinall(range_jobs, raise_error=True)
+        # anything other than partial content means the CDN didn't honour the range
+        if not all(job.value.status_code == 206 for job in range_jobs):
+            return None
+        return b"".join(job.value.content for job in range_jobs)
 
     def _append_file(self):
-        index = 0
-        while index < self.ts_count:
-            segment_filename = self.completed.get(index, '')
-            if segment_filename:
-                with open(os.path.join(args.directory, segment_filename), 'rb') as segment_file:
-                    self.stream_file.write(segment_file.read())
-                os.remove(os.path.join(args.directory, segment_filename))
+        while self.next_index < self.ts_count:
+            if self.gave_up:
+                break
+            segment = self.completed.pop(self.next_index, None)
+            if segment is not None:
+                try:
+                    self.stream_file.write(segment)
+                except OSError as e:
+                    # e.g. ffmpeg exited, nothing more can be written
+                    print_log("download worker", f"failed to write video: {e}")
+                    self._give_up()
+                    break
                 self.download_bar.next()
-                index += 1
+                self.next_index += 1
+                self._move_window()
             else:
-                sleep(0.05)
-        self.stream_file.close()
+                self.segment_ready.wait(timeout=1.0)
+                self.segment_ready.clear()
+        try:
+            # drop whatever preallocated space wasn't used
+            if self.stream_file.seekable():
+                self.stream_file.truncate()
+            self.stream_file.close()
+        except OSError as e:
+            print_log("download worker", f"failed to write video: {e}")
+            self.success = False
+
+    def _move_window(self):
+        # wake every worker waiting on the window, later waiters get a fresh event
+        window_moved = self.window_moved
+        self.window_moved = gevent.event.Event()
+        window_moved.set()
 
 
 def dl_channel(s, ps, channel_id):
@@ -151,7 +343,7 @@ def dl_channel(s, ps, channel_id):
         return
 
     # get base channel data for checking validity
-    init_response = s.get(f'channels/{channel_id}')
+    init_response = s.get(f'channels/{channel_id}', timeout=API_TIMEOUT)
     if not init_response.ok:
         print_log(f"channel:{channel_id}", "failed to get channel information")
         print_log(f"channel:{channel_id}",
@@ -165,13 +357,13 @@ def dl_channel(s, ps, channel_id):
         return
 
     # string to use in output channel filenames
-    channel_string = re.sub(CLEAN_FILENAME_KINDA, "_",
-                            f"{c_init_json['nickname']} [{c_init_json['id']}]").strip()
+    channel_string = CLEAN_FILENAME_KINDA.sub("_",
+                                              f"{c_init_json['nickname']} [{c_init_json['id']}]").strip()
 
     # use search api to retrieve more complete json data
     search_query_param = urllib.parse.urlencode(
         {"search_query": c_init_json["nickname"]})
-    search_response = s.get(f'search-users?{search_query_param}')
+    search_response = s.get(f'search-users?{search_query_param}', timeout=API_TIMEOUT)
 
     # use /channels json if /search-users json doesn't exist/can't be found for some reason
     c_json = c_init_json
@@ -194,60 +386,47 @@ def dl_channel(s, ps, channel_id):
     if args.write_info_json:
         info_filename = f"{channel_string}.info.json"
         info_filepath = os.path.join(args.directory, info_filename)
-        if os.path.isfile(f"{info_filepath}.tmp"):
-            os.remove(f"{info_filepath}.tmp")
         print_log(f"info:{channel_id}",
                   f"writing channel information to '{info_filename}'")
-        with open(f"{info_filepath}.tmp", "w") as channel_info:
-            channel_info.write(json.dumps(c_json))
-        if os.path.isfile(info_filepath):
-            os.remove(info_filepath)
-        os.rename(f"{info_filepath}.tmp", info_filepath)
+        write_file_atomic(info_filepath, json_dumps(c_json))
 
+    artifact_jobs = []
     if args.write_thumbnail:
         # icon (avatar)
-        full_size_icon_url = c_json["l_icon_image_url"]
-        icon_filename = f"{channel_string}-icon.png"
-        icon_filepath = os.path.join(args.directory, icon_filename)
-        if os.path.isfile(f"{icon_filepath}.tmp"):
-            os.remove(f"{icon_filepath}.tmp")
-        print_log(f"icon:{channel_id}",
-                  f"writing channel icon to '{icon_filename}'")
-        icon_response = requests.get(full_size_icon_url)
-        if icon_response.ok:
-            with open(f"{icon_filepath}.tmp", "wb") as channel_icon:
-                channel_icon.write(icon_response.content)
-            if os.path.isfile(icon_filepath):
-                os.remove(icon_filepath)
-            os.rename(f"{icon_filepath}.tmp", icon_filepath)
-        else:
-            print_log(f"icon:{channel_id}", "failed to retrieve channel icon")
-            print_log(
-                f"icon:{channel_id}", f"API response returned status code {icon_response.status_code}", LogLevel.VERBOSE)
-
+        artifact_jobs.append(gevent.spawn(dl_image, c_json["l_icon_image_url"],
+                                          f"{channel_string}-icon.png", f"icon:{channel_id}", "channel icon"))
         # cover (banner)
-        full_size_cover_url = c_json["l_cover_image_url"]
-        cover_filename = f"{channel_string}-cover.png"
-        cover_filepath = os.path.join(args.directory, cover_filename)
-        if os.path.isfile(f"{cover_filepath}.tmp"):
-            os.remove(f"{cover_filepath}.tmp")
-        print_log(f"cover:{channel_id}",
-                  f"writing channel cover to '{cover_filename}'")
-        cover_response = requests.get(full_size_cover_url)
-        if cover_response.ok:
-            with open(f"{cover_filepath}.tmp", "wb") as channel_cover:
-                channel_cover.write(cover_response.content)
-            if os.path.isfile(cover_filepath):
-                os.remove(cover_filepath)
-            os.rename(f"{cover_filepath}.tmp", cover_filepath)
-        else:
-            print_log(f"icon:{channel_id}", "failed to retrieve channel cover")
-            print_log(
-                f"icon:{channel_id}", f"API response returned status code {cover_response.status_code}", LogLevel.VERBOSE)
+        artifact_jobs.append(gevent.spawn(dl_image, c_json["l_cover_image_url"],
+                                          f"{channel_string}-cover.png", f"cover:{channel_id}", "channel cover"))
+
+    # download channel movies as their pages arrive from the API
+    Pool(args.concurrent_videos).map(
+        lambda indexed_movie: dl_channel_movie(s, ps, channel_id, *indexed_movie), enumerate(iter_channel_movies(s, channel_id)))
+    gevent.joinall(artifact_jobs)
+
+
+def iter_channel_movies(s, channel_id):
+    movie_list_response = get_channel_movie_page(s, channel_id, 1)
+    if movie_list_response:
+        print_log(f"channel:{channel_id}", "downloading videos page 1")
+    yield from movie_list_response
+    next_page = 2
+    page_pool = Pool(MOVIE_PAGE_BATCH)
+    while len(movie_list_response) == MAX_MOVIE_RESPONSE:
+        # page count isn't known ahead of time, so request a batch of pages at once and stop at the first short one
+        for page, movie_list_response in enumerate(page_pool.imap(lambda page: get_channel_movie_page(s, channel_id, page),
+                                                                  range(next_page, next_page + MOVIE_PAGE_BATCH)), next_page):
+            # most of a batch may be past the last page, so only pages with videos are reported
+            if movie_list_response:
+                print_log(f"channel:{channel_id}", f"downloading videos page {page}")
+            yield from movie_list_response
+            if len(movie_list_response) < MAX_MOVIE_RESPONSE:
+                break
+        next_page += MOVIE_PAGE_BATCH
+
 
-    # retrieve list of all channel movies from API
-    movie_list = []
-    movie_list_response = []
+def get_channel_movie_page(s, channel_id, page):
+    print_log(f"channel:{channel_id}", f"requesting videos page {page}", LogLevel.VERBOSE)
     movie_search_params = {
         "channel_ids": channel_id,
         "include_live": "true",
@@ -255,40 +434,48 @@ def dl_channel(s, ps, channel_id):
         "include_deleted": "true",
         "onair_status": 2,
         "sort": "published_at",
-        "page": 1,
+        "page": page,
     }
-    while len(movie_list_response) == MAX_MOVIE_RESPONSE or movie_search_params["page"] == 1:
-        print_log(f"channel:{channel_id}",
-                  f"downloading videos page {movie_search_params['page']}")
-        movie_list_response = s.get("search-movies", params=movie_search_params).json()
-        movie_list.append(movie_list_response)
-        movie_search_params["page"] += 1
-    movie_list.append(movie_list_response)
+    # an empty page stops the paging, so errors end the channel listing instead of crashing it
+    movie_list_response = s.get("search-movies", params=movie_search_params, timeout=API_TIMEOUT)
+    if not movie_list_response.ok:
+        print_log(f"channel:{channel_id}", f"failed to get videos page {page}")
+        print_log(
+            f"channel:{channel_id}", f"API response returned status code {movie_list_response.status_code}", LogLevel.VERBOSE)
+        return []
+    try:
+        movie_list_json = json_loads(movie_list_response.content)
+    except ValueError:
+        print_log(f"channel:{channel_id}", f"failed to read videos page {page}")
+        return []
+    if isinstance(movie_list_json, dict) and "status" in movie_list_json:
+        print_log(f"channel:{channel_id}", f"failed to get videos page {page}")
+        print_log(
+            f"channel:{channel_id}", f"API body returned status code {movie_list_json['status']}: {movie_list_json['message']}", LogLevel.VERBOSE)
+        return []
+    return movie_list_json
 
-    for movie_index in range(len(movie_list)):
-        print_log(f"channel:{channel_id}",
-                  f"downloading video {movie_index + 1} of {len(movie_list)}")
-        dl_movie(s, ps, movie_list[movie_index]["id"])
+
+def dl_channel_movie(s, ps, channel_id, movie_index, movie_json):
+    # total isn't known until the last page has been read
+    print_log(f"channel:{channel_id}", f"downloading video {movie_index + 1}")
+    dl_movie(s, ps, movie_json["id"])
 
 
 def dl_movie(s, ps, movie_id):
     # check if we can skip
-    if args.download_archive:
-        if os.path.isfile(args.download_archive):
-            with open(args.download_archive, "r") as archive_file:
-                skip_ids = archive_file.read().splitlines()
-            if movie_id in skip_ids:
-                print_log(f"movie:{movie_id}", "already recorded in archive")
-                return
+    if movie_id in archived_ids:
+        print_log(f"movie:{movie_id}", "already recorded in archive")
+        return
 
     # get public video data and check validity
-    movie_response = s.get(f"movies/{movie_id}")
+    movie_response = s.get(f"movies/{movie_id}", timeout=API_TIMEOUT)
     if not movie_response.ok:
         print_log(f"info:{movie_id}", "failed to get movie information")
         print_log(
             f"info:{movie_id}", f"API response returned status code {movie_response.status_code}", LogLevel.VERBOSE)
         return
-    m_json = movie_response.json()
+    m_json = json_loads(movie_response.content)
     if "status" in m_json:
         print_log(f"info:{movie_id}", "failed to get movie information")
         print_log(
@@ -296,14 +483,29 @@ def dl_movie(s, ps, movie_id):
         return
 
     # string to use in output video names
-    movie_string = re.sub(CLEAN_FILENAME_KINDA, "_",
-                          f"{m_json['title']} [{m_json['id']}]").strip()
+    movie_string = CLEAN_FILENAME_KINDA.sub("_",
+                                            f"{m_json['title']} [{m_json['id']}]").strip()
 
     # remove ad info because we don't care about ads (atm)
     m_json.pop("ad")
 
+    # artifacts only need the public video data, so fetch them while playlists are resolved and downloaded
+    artifact_jobs = []
+    if args.write_thumbnail and not args.list_formats:
+        full_size_thumb_url = FULL_SIZE_IMG.sub(
+            FULL_SIZE_REP, m_json["thumbnail_url"])
+        thumbnail_format = urllib.parse.parse_qs(
+            urllib.parse.urlsplit(full_size_thumb_url).query)["format"][0]
+        artifact_jobs.append(gevent.spawn(dl_image, full_size_thumb_url,
+                                          f"{movie_string}.{thumbnail_format}", f"thumbnail:{movie_id}", "video thumbnail"))
+
+    if args.write_live_chat and not args.list_formats:
+        artifact_jobs.append(gevent.spawn(
+            dl_live_chat, s, movie_id, movie_string, m_json["started_at"]))
+
     m_json["media"] = derive_media_playlists(movie_id, m_json["media"], ps)
     if not m_json["media"]:
+        gevent.joinall(artifact_jobs)
         return
     elif "_url_playlist" in m_json["media"]:
         formats_list = get_m3u8_info(m_json["media"]["_url_playlist"])
@@ -335,42 +537,9 @@ def dl_movie(s, ps, movie_id):
     if args.write_info_json:
         info_filename = f"{movie_string}.info.json"
         info_filepath = os.path.join(args.directory, info_filename)
-        if os.path.isfile(f"{info_filepath}.tmp"):
-            os.remove(f"{info_filepath}.tmp")
         print_log(f"info:{movie_id}",
                   f"writing video information to '{info_filename}'")
-        with open(f"{info_filepath}.tmp", "w") as movie_info:
-            movie_info.write(json.dumps(m_json))
-        if os.path.isfile(info_filepath):
-            os.remove(info_filepath)
-        os.rename(f"{info_filepath}.tmp", info_filepath)
-
-    if args.write_thumbnail:
-        full_size_thumb_url = re.sub(
-            FULL_SIZE_IMG, FULL_SIZE_REP, m_json["thumbnail_url"])
-        thumbnail_format = urllib.parse.parse_qs(
-            full_size_thumb_url)["format"][0]
-        thumbnail_filename = f"{movie_string}.{thumbnail_format}"
-        thumbnail_filepath = os.path.join(args.directory, thumbnail_filename)
-        if os.path.isfile(f"{thumbnail_filepath}.tmp"):
-            os.remove(f"{thumbnail_filepath}.tmp")
-        print_log(f"thumbnail:{movie_id}",
-                  f"writing thumbnail to '{thumbnail_filename}'")
-        thumb_response = requests.get(full_size_thumb_url)
-        if thumb_response.ok:
-            with open(f"{thumbnail_filepath}.tmp", "wb") as movie_thumbnail:
-                movie_thumbnail.write(thumb_response.content)
-            if os.path.isfile(thumbnail_filepath):
-                os.remove(thumbnail_filepath)
-            os.rename(f"{thumbnail_filepath}.tmp", thumbnail_filepath)
-        else:
-            print_log(f"thumbnail:{movie_id}",
-                      "failed to retrieve video thumbnail")
-            print_log(
-                f"thumbnail:{movie_id}", f"API response returned status code {thumb_response.status_code}", LogLevel.VERBOSE)
-
-    if args.write_live_chat:
-        dl_live_chat(s, movie_id, movie_string, m_json["started_at"])
+        write_file_atomic(info_filepath, json_dumps(m_json))
 
     if not args.skip_download:
         if downloading_format is not None:
@@ -380,6 +549,7 @@ def dl_movie(s, ps, movie_id):
                 f"movie:{movie_id}", f"could not find video format '{args.format}'. to view all available formats, use --list-formats")
     else:
         print_log(f"movie:{movie_id}", f"skipping download")
+    gevent.joinall(artifact_jobs)
 
 
 def derive_media_playlists(movie_id, media_json, ps):
@@ -390,7 +560,7 @@ def derive_media_playlists(movie_id, media_json, ps):
             # use the "private" API to get the a playlist url via auth
             view_res = None
             while True:
-                priv_movie_response = ps.get(f"movies/{movie_id}/detail")
+                priv_movie_response = ps.get(f"movies/{movie_id}/detail", timeout=API_TIMEOUT)
                 if not priv_movie_response.ok:
                     print_log(f"info:{movie_id}",
                               "failed to get movie information")
@@ -414,7 +584,7 @@ def derive_media_playlists(movie_id, media_json, ps):
                         if view_data["has_permission"] and view_data["remain"] > 0:
                             # request free watch
                             view_res = ps.post(
-                                "users/me/views-limit", json={"movie_id": movie_id})
+                                "users/me/views-limit", json={"movie_id": movie_id}, timeout=API_TIMEOUT)
                             if not view_res.ok:
                                 print_log(
                                     f"info:{movie_id}", "failed to request watch for movie")
@@ -473,9 +643,9 @@ def derive_media_playlists(movie_id, media_json, ps):
               f"got playlist {base_url}", LogLevel.VERBOSE)
     # API may only give certain playlists by default, others can be derived for more complete information
     # these links might not actually exist, so downloading relies on values from the default playlist.m3u8
-    ol_m = re.search(OLD_PL_HOST, base_url)
-    nl_m = re.search(NEW_PL_HOST, base_url)
-    gl_m = re.search(GAME_PL_HOST, base_url)
+    ol_m = OLD_PL_HOST.search(base_url)
+    nl_m = NEW_PL_HOST.search(base_url)
+    gl_m = GAME_PL_HOST.search(base_url)
     # old hosting, barely any metadata provided, only one index
     if ol_m:
         v_id = ol_m.group("vid")
@@ -521,41 +691,58 @@ def dl_m3u8_video(movie_id, movie_filename, m3u8_link):
     else:
         if os.path.isfile(f"{movie_path}.ts"):
             print_log(f"movie:{movie_id}", f"already downloaded")
-        # can't resume downloads (atm), so remove progress
+        # can't resume downloads (atm), so remove progress (including segments left by older versions)
         else:
             if os.path.isfile(f"{movie_path}.ts.tmp"):
                 os.remove(f"{movie_path}.ts.tmp")
-                for seg_file in os.listdir(args.directory):
-                    if re.fullmatch(r"^" + f"{re.escape(movie_filename)}" + r"\.seg[0-9]{1,}$", seg_file):
-                        os.remove(seg_file)
+                seg_prefix = f"{movie_filename}.seg"
+                with os.scandir(args.directory) as dir_entries:
+                    for seg_file in dir_entries:
+                        if seg_file.name.startswith(seg_prefix) and seg_file.name[len(seg_prefix):].isdigit():
+                            os.remove(seg_file.path)
+            if os.path.isfile(f"{movie_path}.mp4.tmp"):
+                os.remove(f"{movie_path}.mp4.tmp")
 
             # get necessary variables ready
             playlist_base = urllib.parse.urljoin(m3u8_link, ".")
-            m3u8_text = requests.get(
-                m3u8_link, headers={"Referer": "https://www.openrec.tv/"}).text
-            ts_list = [n for n in m3u8_text.splitlines(
-            ) if n and not n.startswith("#")]
-            ordered_ts_list = list(
-                zip(ts_list, [n for n in range(len(ts_list))]))
+            m3u8_text = web_session.get(m3u8_link, timeout=API_TIMEOUT).text
+            ts_list = M3U8_SEGMENT.findall(m3u8_text)
+
+            # convert while downloading by piping the stream into ffmpeg, instead of writing a .ts to convert afterwards
+            ffmpeg_process = None
+            if not args.skip_convert and not args.remux_in_process:
+                ffmpeg_process, ffmpeg_log = start_pipe_convert(movie_path)
+            if ffmpeg_process:
+                stream_file = ffmpeg_process.stdin
+                print_log(f"movie:{movie_id}",
+                          f"writing video to '{movie_filename}.mp4'")
+            else:
+                stream_file = open(f"{movie_path}.ts.tmp",
+                                   "wb", buffering=WRITE_BUFFER_SIZE)
+                print_log(f"movie:{movie_id}",
+                          f"writing video to '{movie_filename}.ts'")
 
             # run the downloader
-            print_log(f"movie:{movie_id}",
-                      f"writing video to '{movie_filename}.ts'")
             stream_downloader = StreamDownloader(playlist_base)
             download_bar = DownloadBar(f"[movie:{movie_id}]", max=len(ts_list))
-            stream_downloader.run(
-                movie_filename, ordered_ts_list, download_bar)
+            stream_downloader.run(stream_file, ts_list, download_bar)
 
             # if success, check if converting
-            if stream_downloader.success:
+            if ffmpeg_process:
+                if not finish_pipe_convert(movie_path, ffmpeg_process, ffmpeg_log, stream_downloader.success):
+                    print_log(f"movie:{movie_id}", f"failed to download")
+                    return
                 download_bar.finish()
-                os.rename(f"{movie_path}.ts.tmp", f"{movie_path}.ts")
+            elif stream_downloader.success:
+                download_bar.finish()
+                os.replace(f"{movie_path}.ts.tmp", f"{movie_path}.ts")
             else:
                 print_log(f"movie:{movie_id}", f"failed to download")
                 return
-        if not args.skip_convert:
+        if not args.skip_convert and not os.path.isfile(f"{movie_path}.mp4"):
             mpeg_convert(os.path.join(args.directory, f"{movie_filename}"))
     if args.download_archive:
+        archived_ids.add(movie_id)
         with open(args.download_archive, "a") as archive_file:
             archive_file.write(f"{movie_id}\n")
 
@@ -574,40 +761,124 @@ def mpeg_convert(file_path):
         print_log("mpeg-convert",
                   f"could not access file '{os.path.basename(file_path)}.ts'")
         return
-    ffmpeg_list = ["ffmpeg", "-i", f"{file_path}.ts",
-                   "-acodec", "copy", "-vcodec", "copy", f"{file_path}.mp4"]
-    try:
-        ffmpeg_process = Popen(ffmpeg_list, stdout=PIPE, stderr=PIPE)
-        stdout, stderr = ffmpeg_process.communicate()
-    except Exception:
-        print_log("mpeg-convert", "failure in executing ffmpeg")
-        print_log(
-            "ffmpeg", f"stdout: {str(stdout)}\n\nstderr: {str(stderr)}", LogLevel.VERBOSE)
-        return
+    if args.remux_in_process and av is None:
+        print_log("mpeg-convert", "PyAV is not installed, falling back to ffmpeg")
+    if args.remux_in_process and av is not None:
+        try:
+            av_remux(file_path)
+        except Exception as e:
+            print_log("mpeg-convert", "failure in remuxing with PyAV")
+            print_log("mpeg-convert", str(e), LogLevel.VERBOSE)
+            if os.path.isfile(f"{file_path}.mp4"):
+                os.remove(f"{file_path}.mp4")
+            return
+    else:
+        ffmpeg_list = ["ffmpeg", "-i", f"{file_path}.ts",
+                       "-acodec", "copy", "-vcodec", "copy", f"{file_path}.mp4"]
+        try:
+            # ffmpeg output is only worth keeping around when debugging
+            ffmpeg_output = None if args.verbose else DEVNULL
+            ffmpeg_process = Popen(
+                ffmpeg_list, stdin=DEVNULL, stdout=ffmpeg_output, stderr=ffmpeg_output)
+            return_code = ffmpeg_process.wait()
+        except Exception as e:
+            print_log("mpeg-convert", "failure in executing ffmpeg")
+            print_log("ffmpeg", str(e), LogLevel.VERBOSE)
+            return
+        if return_code != 0:
+            # a partial .mp4 would otherwise stand in for the .ts below
+            print_log("mpeg-convert",
+                      f"ffmpeg exited with code {return_code}, keeping '{os.path.basename(file_path)}.ts'")
+            if os.path.isfile(f"{file_path}.mp4"):
+                os.remove(f"{file_path}.mp4")
+            return
     # don't remove .ts if .mp4 was not created
     if os.path.isfile(f"{file_path}.mp4"):
         os.remove(f"{file_path}.ts")
 
+
+def start_pipe_convert(file_path):
+    # without progress stats the log only holds real diagnostics
+    ffmpeg_list = ["ffmpeg", "-hide_banner", "-nostats", "-y", "-f", "mpegts", "-i", "pipe:0",
+                   "-acodec", "copy", "-vcodec", "copy", "-f", "mp4", f"{file_path}.mp4.tmp"]
+    # ffmpeg output is only shown if the conversion fails
+    ffmpeg_log = TemporaryFile()
+    try:
+        ffmpeg_process = Popen(ffmpeg_list, stdin=PIPE, stdout=DEVNULL,
+                               stderr=ffmpeg_log, bufsize=WRITE_BUFFER_SIZE)
+    except Exception as e:
+        ffmpeg_log.close()
+        print_log("mpeg-convert",
+                  "failure in executing ffmpeg, converting after download instead")
+        print_log("ffmpeg", str(e), LogLevel.VERBOSE)
+        return None, None
+    return ffmpeg_process, ffmpeg_log
+
+
+def finish_pipe_convert(file_path, ffmpeg_process, ffmpeg_log, download_success):
+    # the downloader closes ffmpeg's stdin, so it exits once the end of the stream is written
+    if not download_success:
+        ffmpeg_process.kill()
+    return_code = ffmpeg_process.wait()
+    with ffmpeg_log:
+        if download_success and return_code == 0:
+            os.replace(f"{file_path}.mp4.tmp", f"{file_path}.mp4")
+            return True
+        if download_success:
+            # the stream only went to ffmpeg, so there is no .ts left to convert again
+            print_log("mpeg-convert",
+                      f"ffmpeg exited with code {return_code}, the download was discarded. use --verbose to see ffmpeg's output, or --skip-convert to keep the .ts file")
+        ffmpeg_log.seek(0)
+        print_log("ffmpeg", ffmpeg_log.read().decode(
+            errors="replace"), LogLevel.VERBOSE)
+    if os.path.isfile(f"{file_path}.mp4.tmp"):
+        os.remove(f"{file_path}.mp4.tmp")
+    return False
+
+
+def av_remux(file_path):
+    with av.open(f"{file_path}.ts") as ts_container, av.open(f"{file_path}.mp4", "w") as mp4_container:
+        stream_map = {}
+        for ts_stream in ts_container.streams:
+            if ts_stream.type not in ("audio", "video"):
+                continue
+            # newer PyAV versions replaced the template argument with its own method
+            if hasattr(mp4_container, "add_stream_from_template"):
+                stream_map[ts_stream.index] = mp4_container.add_stream_from_template(ts_stream)
+            else:
+                stream_map[ts_stream.index] = mp4_container.add_stream(template=ts_stream)
+        for packet in ts_container.demux():
+            # skip flushing packets and streams that aren't copied
+            if packet.dts is None or packet.stream.index not in stream_map:
+                continue
+            packet.stream = stream_map[packet.stream.index]
+            mp4_container.mux(packet)
+
 # based on parts of https://github.com/ytdl-org/youtube-dl/blob/master/youtube_dl/extractor/common.py
 
 
 def get_m3u8_info(playlist_link):
     m3u8_info = []
-    print_log("get-m3u8-info",
-              f"retrieving playlist from {playlist_link}", LogLevel.VERBOSE)
-    m3u8_r = requests.get(playlist_link, headers={
-                          "Referer": "https://www.openrec.tv/"})
-    m3u8_text = m3u8_r.text
+    # the same movie can be asked for more than once in a run, e.g. by itself and in its channel
+    m3u8_text = master_playlists.get(playlist_link)
+    if m3u8_text is None:
+        print_log("get-m3u8-info",
+                  f"retrieving playlist from {playlist_link}", LogLevel.VERBOSE)
+        m3u8_r = web_session.get(playlist_link, timeout=API_TIMEOUT)
+        m3u8_text = m3u8_r.text
+        if m3u8_r.ok:
+            master_playlists[playlist_link] = m3u8_text
     media_details = None
     format_details = None
-    for line in m3u8_text.splitlines():
-        if line.startswith("#EXT-X-MEDIA:"):
+    for line_m in M3U8_LINE.finditer(m3u8_text):
+        if line_m.group("media") is not None:
             # parse media details
-            media_details = parse_m3u8_attributes(line)
-        elif line.startswith("#EXT-X-STREAM-INF:"):
+            media_details = parse_m3u8_attributes(line_m.group("media"))
+        elif line_m.group("format") is not None:
             # parse format details
-            format_details = parse_m3u8_attributes(line)
-        elif not line.startswith("#"):
+            format_details = parse_m3u8_attributes(line_m.group("format"))
+        else:
+            line = line_m.group("uri")
             if line.endswith(".m3u8"):
                 if format_details:
                     if not media_details:
@@ -632,8 +903,8 @@ def get_m3u8_info(playlist_link):
                     print_log(
                         "get-m3u8-info", f"could not find format details for playlist '{line}', please report this issue at \'{ISSUES_URL}\'")
                 if format_details and media_details:
-                    m3u8_info += [{"location": line,
-                                   "media": media_details, "format": format_details}]
+                    m3u8_info.append({"location": line,
+                                      "media": media_details, "format": format_details})
                     media_details = None
                     format_details = None
             else:
@@ -646,7 +917,7 @@ def get_m3u8_info(playlist_link):
 
 def parse_m3u8_attributes(attrib):
     info = {}
-    for (key, val) in re.findall(r'(?P<key>[A-Z0-9-]+)=(?P<val>"[^"]+"|[^",]+)(?:,|$)', attrib):
+    for (key, val) in M3U8_ATTRIBUTE.findall(attrib):
         if val.startswith("\""):
             val = val[1:-1]
         info[key] = val
@@ -665,6 +936,25 @@ def print_formats(formats_list):
               f"{format_settings['format']['CODECS']:<24}")
 
 
+def write_file_atomic(filepath, data):
+    # the temp file is truncated on open, and os.replace overwrites any existing file
+    with open(f"{filepath}.tmp", "wb") as tmp_file:
+        tmp_file.write(data)
+    os.replace(f"{filepath}.tmp", filepath)
+
+
+def dl_image(image_url, image_filename, component, description):
+    image_filepath = os.path.join(args.directory, image_filename)
+    print_log(component, f"writing {description} to '{image_filename}'")
+    image_response = web_session.get(image_url, timeout=IMG_TIMEOUT)
+    if image_response.ok:
+        write_file_atomic(image_filepath, image_response.content)
+    else:
+        print_log(component, f"failed to retrieve {description}")
+        print_log(
+            component, f"API response returned status code {image_response.status_code}", LogLevel.VERBOSE)
+
+
 def dl_live_chat(s, movie_id, movie_filename, started_at):
     live_chat_filename = f"{movie_filename}.live_chat.json"
     live_chat_filepath = os.path.join(args.directory, live_chat_filename)
@@ -675,38 +965,45 @@ def dl_live_chat(s, movie_id, movie_filename, started_at):
     elif os.path.isfile(f"{live_chat_filepath}.tmp"):
         os.remove(f"{live_chat_filepath}.tmp")
 
-    # read datetime object and remove utc offset for using in the chat API
-    chat_dt = datetime.strptime(started_at, "%Y-%m-%dT%H:%M:%S%z")
-    chat_dt = (chat_dt - chat_dt.utcoffset()).replace(tzinfo=None)
+    chat_from = chat_api_time(started_at)
     chat_response = s.get(
-        f"movies/{movie_id}/chats?from_created_at={chat_dt.isoformat()}.000Z&is_including_system_message=false")
+        f"movies/{movie_id}/chats?from_created_at={chat_from}&is_including_system_message=false", timeout=API_TIMEOUT)
 
     print_log(f"live-chat:{movie_id}",
               f"writing live chat to \'{live_chat_filename}\'")
-    with open(f"{live_chat_filepath}.tmp", "w") as live_chat_file:
-        # loop until blank response
-        while chat_response.ok and len(chat_response.json()) > 0:
-            last_post_time = datetime.strptime(
-                chat_response.json()[-1]["posted_at"], "%Y-%m-%dT%H:%M:%S%z")
-            last_post_time = (
-                last_post_time - last_post_time.utcoffset()).replace(tzinfo=None)
+    with open(f"{live_chat_filepath}.tmp", "wb") as live_chat_file:
+        # loop until blank response, parsing each page only once
+        chat_page = json_loads(chat_response.content) if chat_response.ok else None
+        while chat_page:
+            last_post_from = chat_api_time(chat_page[-1]["posted_at"])
             # stop if this is the same date as previously requested
-            if last_post_time.isoformat() == chat_dt.isoformat():
+            if last_post_from == chat_from:
                 break
-            for chat_line in chat_response.json():
-                live_chat_file.write(f"{json.dumps(chat_line)}\n")
-            # use timestamp of last chat post retrieved to fill next url
-            chat_dt = last_post_time
-            chat_response = s.get(
-                f"movies/{movie_id}/chats?from_created_at={chat_dt.isoformat()}.000Z&is_including_system_message=false")
+            # use timestamp of last chat post retrieved to fill next url,
+            # fetching the next page while the current one is written
+            chat_from = last_post_from
+            next_chat_job = gevent.spawn(
+                s.get, f"movies/{movie_id}/chats?from_created_at={chat_from}&is_including_system_message=false", timeout=API_TIMEOUT)
+            # file writes never yield to gevent, so write from a thread while the request is in flight
+            chat_lines = (json_dumps(chat_line) + b"\n" for chat_line in chat_page)
+            gevent.get_hub().threadpool.apply(live_chat_file.writelines, (chat_lines,))
+            chat_response = next_chat_job.get()
+            chat_page = json_loads(chat_response.content) if chat_response.ok else None
     if not chat_response.ok:
         print_log(
             f"live-chat:{movie_id}", f"unexpected ending with API response status code {chat_response.status_code}", LogLevel.VERBOSE)
-    os.rename(f"{live_chat_filepath}.tmp", live_chat_filepath)
+    os.replace(f"{live_chat_filepath}.tmp", live_chat_filepath)
+
+
+def chat_api_time(timestamp):
+    # read datetime object and remove utc offset for using in the chat API
+    chat_dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    chat_dt = (chat_dt - chat_dt.utcoffset()).replace(tzinfo=None)
+    return f"{chat_dt.isoformat(timespec='seconds')}.000Z"
 
 
 def create_priv_api_session(cookie_jar_path=None, cookie_jar=None):
-    priv_session = sessions.BaseUrlSession(base_url=PRIVATE_API)
+    priv_session = make_session(PRIVATE_API)
 
     if cookie_jar_path is not None:
         cookie_jar = cookiejar.MozillaCookieJar(cookie_jar_path)
@@ -729,6 +1026,42 @@ def create_priv_api_session(cookie_jar_path=None, cookie_jar=None):
     return priv_session
 
 
+if requests_cache is not None:
+    class CachedBaseUrlSession(requests_cache.CacheMixin, sessions.BaseUrlSession):
+        pass
+
+
+def make_session(base_url=None, pool_maxsize=10, cache_name=None, retries=None):
+    if cache_name and requests_cache is not None:
+        # chat pages are only read once and caching them blocks the other greenlets on sqlite
+        session = CachedBaseUrlSession(
+            cache_name, base_url=base_url, expire_after=API_CACHE_EXPIRY, allowable_methods=("GET",),
+            urls_expire_after={"*/chats*": requests_cache.DO_NOT_CACHE})
+    else:
+        session = sessions.BaseUrlSession(base_url=base_url)
+    if retries is None:
+        # retry connection errors and server errors with backoff, callers still check the final response
+        retry_args = {"total": 10, "backoff_factor": 0.3,
+                      "status_forcelist": (500, 502, 503, 504), "raise_on_status": False}
+        try:
+            retries = Retry(backoff_jitter=0.3, **retry_args)
+        except TypeError:
+            # backoff_jitter was added in urllib3 2.0
+            retries = Retry(**retry_args)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=10, pool_maxsize=pool_maxsize, max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def create_web_session():
+    # shared by all non-API requests so connections are kept alive between them
+    web_session = make_session(pool_maxsize=50)
+    web_session.headers.update({"Referer": "https://www.openrec.tv/"})
+    return web_session
+
+
 def get_cookies_from_username_password(username, password):
     session = requests.Session()
 
@@ -737,7 +1070,7 @@ def get_cookies_from_username_password(username, password):
         "password": password,
     }
 
-    login_response = session.post(LOGIN_ENDPOINT, data=body)
+    login_response = session.post(LOGIN_ENDPOINT, data=body, timeout=API_TIMEOUT)
 
     if not login_response.ok:
         print_log("openrec", "failed to login with provided credentials")
@@ -760,6 +1093,13 @@ def print_log(component, message, level=LogLevel.BASIC):
     print(f"[{component}] {message}")
 
 
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
 def get_arguments():
     parser.add_argument("--version", action="store_true",
                         help="print version string and exit")
@@ -783,6 +1123,16 @@ def get_arguments():
                         help="do not download the video")
     parser.add_argument("--skip-convert", action="store_true",
                         help="do not use ffmpeg to convert the MPEG-TS stream to MPEG-4")
+    parser.add_argument("--remux-in-process", action="store_true",
+                        help="use PyAV instead of ffmpeg to convert the MPEG-TS stream to MPEG-4")
+    parser.add_argument("--concurrent", metavar="N", type=positive_int, default=10,
+                        help="number of video segments to download at once (defaults to 10)")
+    parser.add_argument("--concurrent-videos", metavar="N", type=positive_int, default=1,
+                        help="number of channel videos to download at once (defaults to 1)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not cache public API responses (only used if requests-cache is installed)")
+    parser.add_argument("--cache-dir", metavar="DIRECTORY", type=str,
+                        help="directory for the API response cache (defaults to current)", default=os.getcwd())
     parser.add_argument("--cookies", metavar="COOKIES FILE",
                         type=str, help="path to a Netscape format cookies file")
     parser.add_argument("links", metavar="LINK", nargs="*",
@@ -795,7 +1145,14 @@ def get_arguments():
 
 
 def main():
-    pub_api_session = sessions.BaseUrlSession(base_url=PUBLIC_API)
+    # nothing else is needed just to print the version, so skip logging in and opening the cache
+    if args.version:
+        print(VERSION_STRING)
+        return
+    api_cache_name = None
+    if not args.no_cache:
+        api_cache_name = os.path.join(args.cache_dir, API_CACHE_NAME)
+    pub_api_session = make_session(PUBLIC_API, cache_name=api_cache_name)
     priv_api_session = None
     if args.cookies:
         if os.path.isfile(args.cookies):
@@ -812,17 +1169,18 @@ def main():
         print_log("openrec-dl",
                   f"missing --username or --password, skipping login")
 
-    if args.version:
-        print(VERSION_STRING)
-        return
+    # read the archive once, it's kept up to date as videos finish
+    if args.download_archive and os.path.isfile(args.download_archive):
+        with open(args.download_archive, "r") as archive_file:
+            archived_ids.update(archive_file.read().splitlines())
     if len(args.links) == 0:
         parser.print_usage()
     elif not os.path.isdir(args.directory):
         os.makedirs(args.directory)
     for link in args.links:
         # is openrec link
-        openrec_m = re.search(OPENREC, link)
-        id_m = re.search(VALID_LIVE_ID, link)
+        openrec_m = OPENREC.search(link)
+        id_m = VALID_LIVE_ID.search(link)
         if openrec_m:
             t = openrec_m.group("type")
             if t == "user":
@@ -841,6 +1199,9 @@ def main():
 
 parser = argparse.ArgumentParser()
 args = get_arguments()
+web_session = create_web_session()
+archived_ids = set()
+master_playlists = {}
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,78 @@
+import importlib.util
+import io
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "openrec-dl.py")
+
+
+def load_openrec_dl():
+    # the script parses its arguments at import time
+    argv = sys.argv
+    sys.argv = ["openrec-dl.py"]
+    try:
+        spec = importlib.util.spec_from_file_location("openrec_dl", SCRIPT_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.argv = argv
+    return module
+
+
+openrec_dl = load_openrec_dl()
+
+
+class UnavailableHandler(BaseHTTPRequestHandler):
+    request_count = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._unavailable()
+
+    def do_GET(self):
+        self._unavailable()
+
+    def _unavailable(self):
+        UnavailableHandler.request_count += 1
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        UnavailableHandler.request_count = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), UnavailableHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cooldown = openrec_dl.CIRCUIT_BREAKER_COOLDOWN
+        openrec_dl.CIRCUIT_BREAKER_COOLDOWN = 0.1
+
+    def tearDown(self):
+        openrec_dl.CIRCUIT_BREAKER_COOLDOWN = self.cooldown
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_trips_when_cdn_always_fails(self):
+        ts_list = [f"{n}.ts" for n in range(200)]
+        downloader = openrec_dl.StreamDownloader(f"http://127.0.0.1:{self.server.server_port}/")
+        download_bar = openrec_dl.DownloadBar("[test]", max=len(ts_list), file=io.StringIO())
+        start = time.monotonic()
+        downloader.run(io.BytesIO(), ts_list, download_bar)
+        elapsed = time.monotonic() - start
+
+        self.assertFalse(downloader.success)
+        self.assertTrue(downloader.gave_up)
+        self.assertLess(elapsed, 20)
+        # no transport retries stacked under the workers' attempts, and no further rounds after the probe
+        self.assertLessEqual(UnavailableHandler.request_count,
+                             openrec_dl.CIRCUIT_BREAKER_FAILURES + 2 * openrec_dl.args.concurrent + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()